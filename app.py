@@ -1,1124 +1,811 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime
-import numpy as np
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-from openpyxl.formatting.rule import ColorScaleRule
-
-st.set_page_config(page_title="落地灯台灯数据分析工具", layout="wide")
-
-def load_data(file):
-    """加载Excel数据"""
-    try:
-        df = pd.read_excel(file)
-        required_columns = ['商品名称', '商品链接', '零售额', '零售量', '成交均价', '品牌']
-        if not all(col in df.columns for col in required_columns):
-            st.error("Excel文件格式不正确，请确保包含所有必需列：商品名称、商品链接、零售额、零售量、成交均价、品牌")
-            return None
-        return df
-    except Exception as e:
-        st.error(f"加载文件时出错：{str(e)}")
-        return None
-
-def combine_platform_data(uploaded_files, platform_names, period_names):
-    """合并多个平台和多个时间段的数据"""
-    all_data = []
-    
-    for file, platform, period in zip(uploaded_files, platform_names, period_names):
-        df = load_data(file)
-        if df is not None:
-            df['平台'] = platform
-            df['时间段'] = period
-            all_data.append(df)
-    
-    if len(all_data) > 0:
-        combined_df = pd.concat(all_data, ignore_index=True)
-        return combined_df
-    else:
-        st.error("所有上传的文件均无法解析，请检查文件格式")
-        return None
-
-def calculate_period_stats(df, period, platform_col='平台'):
-    """计算时间段统计信息"""
-    # 按时间段和平台分组计算统计数据
-    stats = df.groupby([period, platform_col]).agg({
-        '零售额': 'sum',
-        '零售量': 'sum',
-        '成交均价': 'mean'
-    }).round(2).reset_index()
-    
-    # 添加平台累计数据
-    total_stats = df.groupby([period]).agg({
-        '零售额': 'sum',
-        '零售量': 'sum',
-        '成交均价': 'mean'
-    }).round(2).reset_index()
-    total_stats[platform_col] = '所有平台'
-    
-    # 合并平台数据和累计数据
-    all_stats = pd.concat([stats, total_stats], ignore_index=True)
-    
-    # 计算同比变化
-    # 为每个平台单独计算同比变化
-    result_dfs = []
-    
-    for platform in all_stats[platform_col].unique():
-        platform_data = all_stats[all_stats[platform_col] == platform].copy().sort_values(by=period)
-        platform_data['零售额同比变化'] = platform_data['零售额'].pct_change() * 100
-        platform_data['零售量同比变化'] = platform_data['零售量'].pct_change() * 100
-        platform_data['成交均价同比变化'] = platform_data['成交均价'].pct_change() * 100
-        result_dfs.append(platform_data)
-    
-    final_stats = pd.concat(result_dfs, ignore_index=True)
-    
-    return final_stats
-
-def calculate_brand_share(df, period, platform_col='平台'):
-    """计算品牌占比"""
-    # 按时间段、平台和品牌分组计算统计数据
-    brand_stats = df.groupby([period, platform_col, '品牌']).agg({
-        '零售额': 'sum',
-        '零售量': 'sum'
-    }).reset_index()
-    
-    # 计算每个时间段和平台的总额和总量
-    period_platform_totals = df.groupby([period, platform_col]).agg({
-        '零售额': 'sum',
-        '零售量': 'sum'
-    })
-    
-    # 计算占比
-    brand_stats['零售额占比'] = brand_stats.apply(
-        lambda x: (x['零售额'] / period_platform_totals.loc[(x[period], x[platform_col]), '零售额']) * 100, 
-        axis=1
-    )
-    brand_stats['零售量占比'] = brand_stats.apply(
-        lambda x: (x['零售量'] / period_platform_totals.loc[(x[period], x[platform_col]), '零售量']) * 100, 
-        axis=1
-    )
-    
-    # 添加所有平台合计数据
-    all_platform_brand_stats = df.groupby([period, '品牌']).agg({
-        '零售额': 'sum',
-        '零售量': 'sum'
-    }).reset_index()
-    
-    all_platform_totals = df.groupby([period]).agg({
-        '零售额': 'sum',
-        '零售量': 'sum'
-    })
-    
-    all_platform_brand_stats[platform_col] = '所有平台'
-    all_platform_brand_stats['零售额占比'] = all_platform_brand_stats.apply(
-        lambda x: (x['零售额'] / all_platform_totals.loc[x[period], '零售额']) * 100, 
-        axis=1
-    )
-    all_platform_brand_stats['零售量占比'] = all_platform_brand_stats.apply(
-        lambda x: (x['零售量'] / all_platform_totals.loc[x[period], '零售量']) * 100, 
-        axis=1
-    )
-    
-    # 合并所有数据
-    all_brand_stats = pd.concat([brand_stats, all_platform_brand_stats], ignore_index=True)
-    
-    return all_brand_stats
-
-def analyze_price_segments(df, period, price_ranges, platform_col='平台'):
-    """分析价位段"""
-    # 创建价位段标签
-    ranges = price_ranges
-    df = df.copy()
-    labels = [f"{ranges[i]}-{ranges[i+1]}" for i in range(len(ranges)-1)]
-    df['价位段'] = pd.cut(df['成交均价'], bins=price_ranges, labels=labels)
-    
-    # 按时间段、平台和价位段分组计算统计数据
-    segment_stats = df.groupby([period, platform_col, '价位段']).agg({
-        '零售额': 'sum',
-        '零售量': 'sum'
-    }).reset_index()
-    
-    # 计算每个时间段和平台的总额和总量
-    period_platform_totals = df.groupby([period, platform_col]).agg({
-        '零售额': 'sum',
-        '零售量': 'sum'
-    })
-    
-    # 计算占比
-    segment_stats['零售额占比'] = segment_stats.apply(
-        lambda x: (x['零售额'] / period_platform_totals.loc[(x[period], x[platform_col]), '零售额']) * 100 if x['价位段'] is not None else 0, 
-        axis=1
-    )
-    segment_stats['零售量占比'] = segment_stats.apply(
-        lambda x: (x['零售量'] / period_platform_totals.loc[(x[period], x[platform_col]), '零售量']) * 100 if x['价位段'] is not None else 0, 
-        axis=1
-    )
-    
-    # 添加所有平台合计数据
-    all_platform_segment_stats = df.groupby([period, '价位段']).agg({
-        '零售额': 'sum',
-        '零售量': 'sum'
-    }).reset_index()
-    
-    all_platform_totals = df.groupby([period]).agg({
-        '零售额': 'sum',
-        '零售量': 'sum'
-    })
-    
-    all_platform_segment_stats[platform_col] = '所有平台'
-    all_platform_segment_stats['零售额占比'] = all_platform_segment_stats.apply(
-        lambda x: (x['零售额'] / all_platform_totals.loc[x[period], '零售额']) * 100 if x['价位段'] is not None else 0,
-        axis=1
-    )
-    all_platform_segment_stats['零售量占比'] = all_platform_segment_stats.apply(
-        lambda x: (x['零售量'] / all_platform_totals.loc[x[period], '零售量']) * 100 if x['价位段'] is not None else 0,
-        axis=1
-    )
-    
-    # 合并所有数据
-    all_segment_stats = pd.concat([segment_stats, all_platform_segment_stats], ignore_index=True)
-    
-    # 计算同比变化
-    result_dfs = []
-    
-    for platform in all_segment_stats[platform_col].unique():
-        platform_data = all_segment_stats[(all_segment_stats[platform_col] == platform)].copy()
-        
-        for price_segment in platform_data['价位段'].unique():
-            if price_segment is not None:
-                segment_data = platform_data[platform_data['价位段'] == price_segment].sort_values(by=period)
-                segment_data['零售额占比变化'] = segment_data['零售额占比'].pct_change() * 100
-                segment_data['零售量占比变化'] = segment_data['零售量占比'].pct_change() * 100
-                result_dfs.append(segment_data)
-    
-    if result_dfs:
-        final_segment_stats = pd.concat(result_dfs, ignore_index=True)
-        return final_segment_stats
-    else:
-        return all_segment_stats
-
-def get_top_brands_by_segment(df, period, price_ranges, platform_col='平台', n=5):
-    """获取每个价位段的TOP品牌"""
-    # 创建价位段标签
-    ranges = price_ranges
-    df = df.copy()
-    labels = [f"{ranges[i]}-{ranges[i+1]}" for i in range(len(ranges)-1)]
-    df['价位段'] = pd.cut(df['成交均价'], bins=price_ranges, labels=labels)
-    
-    # 按时间段、平台、价位段和品牌分组计算统计数据
-    top_brands = df.groupby([period, platform_col, '价位段', '品牌']).agg({
-        '零售额': 'sum',
-        '零售量': 'sum'
-    }).reset_index()
-    
-    # 计算每个时间段、平台和价位段的总量
-    segment_totals = df.groupby([period, platform_col, '价位段']).agg({
-        '零售额': 'sum',
-        '零售量': 'sum'
-    })
-    
-    # 计算品牌占比
-    def calculate_share(row):
-        try:
-            if row['价位段'] is not None:
-                total = segment_totals.loc[(row[period], row[platform_col], row['价位段'])]
-                return (row['零售额'] / total['零售额']) * 100
-            return 0
-        except:
-            return 0
-    
-    def calculate_volume_share(row):
-        try:
-            if row['价位段'] is not None:
-                total = segment_totals.loc[(row[period], row[platform_col], row['价位段'])]
-                return (row['零售量'] / total['零售量']) * 100
-            return 0
-        except:
-            return 0
-    
-    top_brands['零售额占比'] = top_brands.apply(calculate_share, axis=1)
-    top_brands['零售量占比'] = top_brands.apply(calculate_volume_share, axis=1)
-    
-    # 获取各平台TOP N品牌
-    result_dfs = []
-    
-    for p in top_brands[period].unique():
-        for platform in top_brands[platform_col].unique():
-            for segment in top_brands['价位段'].unique():
-                if segment is not None:
-                    segment_data = top_brands[
-                        (top_brands[period] == p) & 
-                        (top_brands[platform_col] == platform) & 
-                        (top_brands['价位段'] == segment)
-                    ].sort_values(by='零售额', ascending=False).head(n)
-                    
-                    result_dfs.append(segment_data)
-    
-    # 添加所有平台合计数据
-    # 按时间段、价位段和品牌分组计算汇总数据
-    all_platform_top_brands = df.groupby([period, '价位段', '品牌']).agg({
-        '零售额': 'sum',
-        '零售量': 'sum'
-    }).reset_index()
-    
-    # 计算每个时间段和价位段的总量
-    all_platform_segment_totals = df.groupby([period, '价位段']).agg({
-        '零售额': 'sum',
-        '零售量': 'sum'
-    })
-    
-    # 计算汇总的品牌占比
-    def calculate_all_platform_share(row):
-        try:
-            if row['价位段'] is not None:
-                total = all_platform_segment_totals.loc[(row[period], row['价位段'])]
-                return (row['零售额'] / total['零售额']) * 100
-            return 0
-        except:
-            return 0
-    
-    def calculate_all_platform_volume_share(row):
-        try:
-            if row['价位段'] is not None:
-                total = all_platform_segment_totals.loc[(row[period], row['价位段'])]
-                return (row['零售量'] / total['零售量']) * 100
-            return 0
-        except:
-            return 0
-    
-    all_platform_top_brands['零售额占比'] = all_platform_top_brands.apply(calculate_all_platform_share, axis=1)
-    all_platform_top_brands['零售量占比'] = all_platform_top_brands.apply(calculate_all_platform_volume_share, axis=1)
-    all_platform_top_brands[platform_col] = '所有平台'
-    
-    # 获取所有平台TOP N品牌
-    all_platform_result_dfs = []
-    
-    for p in all_platform_top_brands[period].unique():
-        for segment in all_platform_top_brands['价位段'].unique():
-            if segment is not None:
-                segment_data = all_platform_top_brands[
-                    (all_platform_top_brands[period] == p) & 
-                    (all_platform_top_brands['价位段'] == segment)
-                ].sort_values(by='零售额', ascending=False).head(n)
-                
-                all_platform_result_dfs.append(segment_data)
-    
-    # 合并所有结果
-    if result_dfs and all_platform_result_dfs:
-        top_brands_results = pd.concat(result_dfs + all_platform_result_dfs, ignore_index=True)
-        return top_brands_results
-    elif result_dfs:
-        return pd.concat(result_dfs, ignore_index=True)
-    elif all_platform_result_dfs:
-        return pd.concat(all_platform_result_dfs, ignore_index=True)
-    else:
-        return pd.DataFrame()
-
-def get_top_products_by_segment(df, period, price_ranges, platform_col='平台', n=5):
-    """获取每个价位段的TOP产品"""
-    # 创建价位段标签
-    ranges = price_ranges
-    df = df.copy()
-    labels = [f"{ranges[i]}-{ranges[i+1]}" for i in range(len(ranges)-1)]
-    df['价位段'] = pd.cut(df['成交均价'], bins=price_ranges, labels=labels)
-    
-    # 按时间段、平台、价位段和产品名称分组计算统计数据
-    top_products = df.groupby([period, platform_col, '价位段', '商品名称', '商品链接']).agg({
-        '零售额': 'sum',
-        '零售量': 'sum',
-        '成交均价': 'mean'
-    }).reset_index()
-    
-    # 获取各平台TOP N产品
-    result_dfs = []
-    
-    for p in top_products[period].unique():
-        for platform in top_products[platform_col].unique():
-            for segment in top_products['价位段'].unique():
-                if segment is not None:
-                    segment_data = top_products[
-                        (top_products[period] == p) & 
-                        (top_products[platform_col] == platform) & 
-                        (top_products['价位段'] == segment)
-                    ].sort_values(by='零售额', ascending=False).head(n)
-                    
-                    result_dfs.append(segment_data)
-    
-    # 添加所有平台合计数据
-    # 按时间段、价位段和产品名称分组计算汇总数据
-    all_platform_top_products = df.groupby([period, '价位段', '商品名称', '商品链接']).agg({
-        '零售额': 'sum',
-        '零售量': 'sum',
-        '成交均价': 'mean'
-    }).reset_index()
-    
-    all_platform_top_products[platform_col] = '所有平台'
-    
-    # 获取所有平台TOP N产品
-    all_platform_result_dfs = []
-    
-    for p in all_platform_top_products[period].unique():
-        for segment in all_platform_top_products['价位段'].unique():
-            if segment is not None:
-                segment_data = all_platform_top_products[
-                    (all_platform_top_products[period] == p) & 
-                    (all_platform_top_products['价位段'] == segment)
-                ].sort_values(by='零售额', ascending=False).head(n)
-                
-                all_platform_result_dfs.append(segment_data)
-    
-    # 合并所有结果
-    if result_dfs and all_platform_result_dfs:
-        top_products_results = pd.concat(result_dfs + all_platform_result_dfs, ignore_index=True)
-        return top_products_results
-    elif result_dfs:
-        return pd.concat(result_dfs, ignore_index=True)
-    elif all_platform_result_dfs:
-        return pd.concat(all_platform_result_dfs, ignore_index=True)
-    else:
-        return pd.DataFrame()
-
-def plot_period_comparison(df, period, metric, platform_col='平台'):
-    """绘制时间段对比图表"""
-    fig = px.line(df, x=period, y=metric, color=platform_col,
-                  title=f'{metric}时间段对比',
-                  labels={period: '时间段', metric: metric})
-    return fig
-
-def plot_brand_comparison(df, period, platform_col='平台', n=10):
-    """绘制品牌对比图表"""
-    # 获取每个时间段TOP N品牌
-    top_brands = df.groupby([period, platform_col, '品牌'])['零售额'].sum().reset_index()
-    top_brands = top_brands.sort_values([period, platform_col, '零售额'], ascending=[True, True, False])
-    top_brands = top_brands.groupby([period, platform_col]).head(n)
-    
-    fig = px.bar(top_brands, x='品牌', y='零售额', color=platform_col,
-                 title=f'TOP {n}品牌对比',
-                 labels={'品牌': '品牌名称', '零售额': '零售额'})
-    return fig
-
-def plot_price_segment_comparison(df, period, platform_col='平台'):
-    """绘制价位段对比图表"""
-    fig = px.bar(df, x='价位段', y='零售额占比', color=platform_col,
-                 title='各价位段零售额占比对比',
-                 labels={'价位段': '价位段', '零售额占比': '零售额占比(%)'})
-    return fig
-
-def format_excel_output(writer, period_stats, top_10_brands, segment_stats, top_brands, top_products):
-    """美化Excel输出格式，让不同时间段对比更直观"""
-    # 创建样式
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    from openpyxl.utils import get_column_letter
-    from openpyxl.formatting.rule import ColorScaleRule
-    
-    # 基础样式
-    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True)
-    border = Border(
-        left=Side(style='thin'), right=Side(style='thin'),
-        top=Side(style='thin'), bottom=Side(style='thin')
-    )
-    
-    # 安全处理分类数据和NaN值
-    # 1. 对于包含分类数据的DataFrame，先将其转换为普通DataFrame
-    if hasattr(period_stats, 'dtypes'):
-        for col, dtype in period_stats.dtypes.items():
-            if str(dtype) == 'category':
-                period_stats[col] = period_stats[col].astype(str)
-    
-    if hasattr(top_10_brands, 'dtypes'):
-        for col, dtype in top_10_brands.dtypes.items():
-            if str(dtype) == 'category':
-                top_10_brands[col] = top_10_brands[col].astype(str)
-    
-    if hasattr(segment_stats, 'dtypes'):
-        for col, dtype in segment_stats.dtypes.items():
-            if str(dtype) == 'category':
-                segment_stats[col] = segment_stats[col].astype(str)
-    
-    if hasattr(top_brands, 'dtypes'):
-        for col, dtype in top_brands.dtypes.items():
-            if str(dtype) == 'category':
-                top_brands[col] = top_brands[col].astype(str)
-    
-    if hasattr(top_products, 'dtypes'):
-        for col, dtype in top_products.dtypes.items():
-            if str(dtype) == 'category':
-                top_products[col] = top_products[col].astype(str)
-    
-    # 2. 然后再填充NaN值
-    period_stats = period_stats.fillna(0)
-    top_10_brands = top_10_brands.fillna(0)
-    segment_stats = segment_stats.fillna(0)
-    top_brands = top_brands.fillna(0)
-    top_products = top_products.fillna(0)
-    
-    # 确保至少写入一个工作表，防止"At least one sheet must be visible"错误
-    # 写入基础数据表，这些表必定会存在
-    period_stats.to_excel(writer, sheet_name='时间段统计', index=False)
-    top_10_brands.to_excel(writer, sheet_name='品牌占比分析', index=False)
-    segment_stats.to_excel(writer, sheet_name='价位段统计', index=False)
-    
-    # 写入可能为空的表
-    if not top_brands.empty:
-        top_brands.to_excel(writer, sheet_name='价位段TOP品牌', index=False)
-    else:
-        # 如果表为空，创建一个简单的表防止错误
-        pd.DataFrame({'提示': ['没有找到符合条件的价位段TOP品牌数据']}).to_excel(
-            writer, sheet_name='价位段TOP品牌', index=False)
-    
-    if not top_products.empty:
-        top_products.to_excel(writer, sheet_name='价位段TOP产品', index=False)
-    else:
-        # 如果表为空，创建一个简单的表防止错误
-        pd.DataFrame({'提示': ['没有找到符合条件的价位段TOP产品数据']}).to_excel(
-            writer, sheet_name='价位段TOP产品', index=False)
-    
-    # 创建各种对比专用表
-    create_period_comparison_sheet(writer, period_stats)
-    create_brand_comparison_sheet(writer, top_10_brands)
-    create_segment_comparison_sheet(writer, segment_stats)
-    
-    # 只有当数据不为空时才创建这些表
-    if not top_brands.empty and len(top_brands['时间段'].unique()) > 1:
-        create_top_brands_comparison_sheet(writer, top_brands)
-    
-    if not top_products.empty and len(top_products['时间段'].unique()) > 1:
-        create_top_products_comparison_sheet(writer, top_products)
-    
-    # 应用样式到所有工作表
-    for sheet_name in writer.sheets:
-        ws = writer.sheets[sheet_name]
-        
-        # 设置表头样式
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.border = border
-            cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        
-        # 调整列宽
-        for i, col in enumerate(ws.columns, 1):
-            # 调整列宽时考虑内容长度
-            max_length = 0
-            for cell in col:
-                if cell.value:
-                    try:
-                        max_length = max(max_length, len(str(cell.value)))
-                    except:
-                        pass
-            adjusted_width = min(max(15, max_length + 2), 40)  # 最小15，最大40
-            ws.column_dimensions[get_column_letter(i)].width = adjusted_width
-        
-        # 应用条件格式到变化率列
-        if sheet_name == '时间段统计':
-            for col in ['零售额同比变化', '零售量同比变化', '成交均价同比变化']:
-                if col in period_stats.columns:
-                    try:
-                        col_idx = list(period_stats.columns).index(col) + 1
-                        ws.conditional_formatting.add(
-                            f"{get_column_letter(col_idx)}2:{get_column_letter(col_idx)}{len(period_stats)+1}",
-                            ColorScaleRule(
-                                start_type='min', start_color='E67C73',  # 红色（负值）
-                                mid_type='num', mid_value=0, mid_color='FFFFFF',  # 白色（零值）
-                                end_type='max', end_color='57BB8A'  # 绿色（正值）
-                            )
-                        )
-                    except Exception as e:
-                        pass  # 忽略条件格式错误，不影响主要功能
-        
-        # 对所有对比分析表应用条件格式
-        if '对比分析' in sheet_name:
-            try:
-                # 对比表使用更明显的条件格式
-                for col_idx in range(2, ws.max_column + 1):
-                    col_letter = get_column_letter(col_idx)
-                    # 只对变化率列应用条件格式
-                    if ws[f'{col_letter}1'].value and ('(%)' in str(ws[f'{col_letter}1'].value) or '变化' in str(ws[f'{col_letter}1'].value)):
-                        ws.conditional_formatting.add(
-                            f"{col_letter}2:{col_letter}{ws.max_row}",
-                            ColorScaleRule(
-                                start_type='min', start_color='E67C73',
-                                mid_type='num', mid_value=0, mid_color='FFFFFF',
-                                end_type='max', end_color='57BB8A'
-                            )
-                        )
-            except Exception as e:
-                pass  # 忽略条件格式错误，不影响主要功能
-            
-            # 添加交替行颜色，增强可读性
-            try:
-                for row in range(2, ws.max_row + 1, 2):
-                    for col in range(1, ws.max_column + 1):
-                        cell = ws[f'{get_column_letter(col)}{row}']
-                        cell.fill = PatternFill(start_color="F5F5F5", end_color="F5F5F5", fill_type="solid")
-            except Exception as e:
-                pass  # 忽略样式错误，不影响主要功能
-
-def create_period_comparison_sheet(writer, period_stats):
-    """创建时间段对比专用表"""
-    # 提取所有时间段
-    periods = sorted(period_stats['时间段'].unique())  # 确保时间段是排序的
-    platforms = period_stats['平台'].unique()
-    
-    # 只有当有多个时间段时才创建对比表
-    if len(periods) <= 1:
-        return
-        
-    # 创建对比数据
-    comparison_data = []
-    
-    for platform in platforms:
-        platform_data = period_stats[period_stats['平台'] == platform]
-        
-        if len(platform_data) > 1:
-            # 对每个平台计算不同时间段之间的变化
-            for metric in ['零售额', '零售量', '成交均价']:
-                row = {'指标': f'{platform} - {metric}'}
-                
-                # 添加每个时间段的原始值
-                for period in periods:
-                    period_value = platform_data[platform_data['时间段'] == period][metric].values
-                    if len(period_value) > 0:
-                        row[period] = period_value[0]
-                    else:
-                        row[period] = None
-                
-                # 计算环比变化率
-                for i in range(1, len(periods)):
-                    prev_period = periods[i-1]
-                    curr_period = periods[i]
-                    
-                    if prev_period in row and curr_period in row and row[prev_period] is not None and row[curr_period] is not None and row[prev_period] != 0:
-                        row[f'{curr_period} vs {prev_period} (%)'] = ((row[curr_period] / row[prev_period]) - 1) * 100
-                    else:
-                        row[f'{curr_period} vs {prev_period} (%)'] = None
-                
-                comparison_data.append(row)
-    
-    # 创建DataFrame并写入Excel
-    if comparison_data:
-        comparison_df = pd.DataFrame(comparison_data)
-        
-        # 重新排列列顺序，保证先显示所有时间段的数据，再显示环比变化
-        columns = ['指标']
-        for period in periods:
-            columns.append(period)
-        for i in range(1, len(periods)):
-            columns.append(f'{periods[i]} vs {periods[i-1]} (%)')
-        
-        # 确保列在DataFrame中存在再进行选择
-        final_columns = ['指标']
-        for col in columns[1:]:
-            if col in comparison_df.columns:
-                final_columns.append(col)
-        
-        # 重新排序列
-        comparison_df = comparison_df[final_columns]
-        
-        comparison_df.to_excel(writer, sheet_name='时间段对比分析', index=False)
-        
-        # 格式化百分比列
-        ws = writer.sheets['时间段对比分析']
-        for i, col_name in enumerate(comparison_df.columns):
-            if '(%)' in col_name:
-                col_letter = get_column_letter(i + 1)
-                for row in range(2, len(comparison_df) + 2):
-                    cell = ws[f'{col_letter}{row}']
-                    if cell.value is not None:
-                        cell.number_format = '0.00%'
-            elif col_name in periods:  # 为数值列添加千分位格式
-                col_letter = get_column_letter(i + 1)
-                for row in range(2, len(comparison_df) + 2):
-                    cell = ws[f'{col_letter}{row}']
-                    if cell.value is not None and '均价' in ws['A'+str(row)].value:
-                        cell.number_format = '#,##0.00'  # 均价保留两位小数
-                    elif cell.value is not None:
-                        cell.number_format = '#,##0'  # 其他数值采用千分位格式
-
-def create_brand_comparison_sheet(writer, top_brands):
-    """创建品牌占比对比专用表"""
-    # 如果没有品牌数据或时间段不足，则不创建
-    if top_brands.empty or len(top_brands['时间段'].unique()) <= 1:
-        return
-    
-    # 按平台和品牌分组，展示各时间段的占比变化
-    comparison_data = []
-    
-    for platform in top_brands['平台'].unique():
-        platform_data = top_brands[top_brands['平台'] == platform]
-        
-        # 获取该平台下所有时间段的TOP品牌
-        top_brands_in_platform = platform_data['品牌'].unique()
-        periods = platform_data['时间段'].unique()
-        
-        for brand in top_brands_in_platform:
-            brand_data = platform_data[platform_data['品牌'] == brand]
-            
-            if len(brand_data) > 1:  # 只分析在多个时间段出现的品牌
-                row = {'平台': platform, '品牌': brand}
-                
-                # 添加每个时间段的零售额占比
-                for period in periods:
-                    period_value = brand_data[brand_data['时间段'] == period]
-                    if not period_value.empty:
-                        row[f'{period} 零售额'] = period_value['零售额'].values[0]
-                        row[f'{period} 零售额占比(%)'] = period_value['零售额占比'].values[0]
-                    else:
-                        row[f'{period} 零售额'] = None
-                        row[f'{period} 零售额占比(%)'] = None
-                
-                # 计算环比变化
-                prev_share = None
-                prev_period = None
-                
-                for period in sorted(periods):
-                    share_key = f'{period} 零售额占比(%)'
-                    if share_key in row and row[share_key] is not None:
-                        if prev_share is not None and prev_period is not None:
-                            row[f'{period} vs {prev_period} 占比变化(%)'] = row[share_key] - prev_share
-                        prev_share = row[share_key]
-                        prev_period = period
-                
-                comparison_data.append(row)
-    
-    # 创建DataFrame并写入Excel
-    if comparison_data:
-        comparison_df = pd.DataFrame(comparison_data)
-        # 按平台和零售额占比降序排序
-        comparison_df.to_excel(writer, sheet_name='品牌占比对比分析', index=False)
-
-def create_segment_comparison_sheet(writer, segment_stats):
-    """创建价位段对比专用表"""
-    # 如果没有价位段数据或时间段不足，则不创建
-    if segment_stats.empty or len(segment_stats['时间段'].unique()) <= 1:
-        return
-    
-    # 按平台和价位段分组，展示各时间段的占比变化
-    comparison_data = []
-    
-    for platform in segment_stats['平台'].unique():
-        platform_data = segment_stats[segment_stats['平台'] == platform]
-        
-        # 获取该平台下所有价位段
-        segments = platform_data['价位段'].unique()
-        periods = platform_data['时间段'].unique()
-        
-        for segment in segments:
-            if segment is not None:
-                segment_data = platform_data[platform_data['价位段'] == segment]
-                
-                if len(segment_data) > 1:  # 只分析在多个时间段出现的价位段
-                    row = {'平台': platform, '价位段': segment}
-                    
-                    # 添加每个时间段的零售额占比
-                    for period in periods:
-                        period_value = segment_data[segment_data['时间段'] == period]
-                        if not period_value.empty:
-                            row[f'{period} 零售额'] = period_value['零售额'].values[0]
-                            row[f'{period} 零售额占比(%)'] = period_value['零售额占比'].values[0]
-                        else:
-                            row[f'{period} 零售额'] = None
-                            row[f'{period} 零售额占比(%)'] = None
-                    
-                    # 计算环比变化
-                    prev_share = None
-                    prev_period = None
-                    
-                    for period in sorted(periods):
-                        share_key = f'{period} 零售额占比(%)'
-                        if share_key in row and row[share_key] is not None:
-                            if prev_share is not None and prev_period is not None:
-                                row[f'{period} vs {prev_period} 占比变化(%)'] = row[share_key] - prev_share
-                            prev_share = row[share_key]
-                            prev_period = period
-                    
-                    comparison_data.append(row)
-    
-    # 创建DataFrame并写入Excel
-    if comparison_data:
-        comparison_df = pd.DataFrame(comparison_data)
-        comparison_df.to_excel(writer, sheet_name='价位段占比对比分析', index=False)
-
-def create_top_brands_comparison_sheet(writer, top_brands_segment):
-    """创建价位段TOP品牌对比专用表"""
-    # 如果没有价位段TOP品牌数据或时间段不足，则不创建
-    if top_brands_segment.empty or len(top_brands_segment['时间段'].unique()) <= 1:
-        return
-    
-    # 按平台、价位段和品牌分组，展示各时间段的占比变化
-    comparison_data = []
-    
-    for platform in top_brands_segment['平台'].unique():
-        platform_data = top_brands_segment[top_brands_segment['平台'] == platform]
-        
-        for segment in platform_data['价位段'].unique():
-            if segment is not None:
-                segment_data = platform_data[platform_data['价位段'] == segment]
-                
-                # 获取该价位段下所有品牌
-                brands = segment_data['品牌'].unique()
-                periods = segment_data['时间段'].unique()
-                
-                for brand in brands:
-                    brand_data = segment_data[segment_data['品牌'] == brand]
-                    
-                    if len(brand_data) > 1:  # 只分析在多个时间段出现的品牌
-                        row = {'平台': platform, '价位段': segment, '品牌': brand}
-                        
-                        # 添加每个时间段的零售额占比
-                        for period in sorted(periods):
-                            period_value = brand_data[brand_data['时间段'] == period]
-                            if not period_value.empty:
-                                row[f'{period} 零售额'] = period_value['零售额'].values[0]
-                                row[f'{period} 零售额占比(%)'] = period_value['零售额占比'].values[0]
-                            else:
-                                row[f'{period} 零售额'] = None
-                                row[f'{period} 零售额占比(%)'] = None
-                        
-                        # 计算环比变化
-                        prev_share = None
-                        prev_period = None
-                        
-                        for period in sorted(periods):
-                            share_key = f'{period} 零售额占比(%)'
-                            if share_key in row and row[share_key] is not None:
-                                if prev_share is not None and prev_period is not None:
-                                    row[f'{period} vs {prev_period} 占比变化(%)'] = row[share_key] - prev_share
-                                prev_share = row[share_key]
-                                prev_period = period
-                        
-                        comparison_data.append(row)
-    
-    # 创建DataFrame并写入Excel
-    if comparison_data:
-        comparison_df = pd.DataFrame(comparison_data)
-        
-        # 按价位段排序品牌对比数据
-        try:
-            # 获取最后一个时间段
-            periods = sorted(top_brands_segment['时间段'].unique())
-            if periods:
-                last_period = periods[-1]
-                last_period_column = f'{last_period} 零售额占比(%)'
-                
-                # 如果存在这个列，按它排序
-                if last_period_column in comparison_df.columns:
-                    comparison_df = comparison_df.sort_values(
-                        by=['平台', '价位段', last_period_column], 
-                        ascending=[True, True, False]
-                    )
-        except:
-            # 如果排序出错，保持原有顺序
-            pass
-            
-        comparison_df.to_excel(writer, sheet_name='价位段品牌对比分析', index=False)
-
-def create_top_products_comparison_sheet(writer, top_products):
-    """创建价位段TOP产品时间段对比专用表"""
-    # 如果没有价位段产品数据或时间段不足，则不创建
-    if top_products.empty or len(top_products['时间段'].unique()) <= 1:
-        return
-    
-    # 按平台、价位段和商品分组，展示各时间段的销量和均价变化
-    comparison_data = []
-    
-    # 跟踪每个产品在所有时间段的出现情况
-    product_period_count = {}
-    
-    # 首先统计每个产品在不同时间段的出现次数
-    for platform in top_products['平台'].unique():
-        platform_data = top_products[top_products['平台'] == platform]
-        
-        for segment in platform_data['价位段'].unique():
-            if segment is not None:
-                segment_data = platform_data[platform_data['价位段'] == segment]
-                
-                for _, row in segment_data.iterrows():
-                    product_key = (platform, segment, row['商品名称'])
-                    if product_key not in product_period_count:
-                        product_period_count[product_key] = set()
-                    product_period_count[product_key].add(row['时间段'])
-    
-    # 创建热销产品的时间段对比数据
-    for platform in top_products['平台'].unique():
-        platform_data = top_products[top_products['平台'] == platform]
-        
-        for segment in platform_data['价位段'].unique():
-            if segment is not None:
-                segment_data = platform_data[platform_data['价位段'] == segment]
-                
-                # 获取该价位段下所有产品
-                product_names = segment_data['商品名称'].unique()
-                periods = segment_data['时间段'].unique()
-                
-                # 按照时间段数量排序，优先展示在多个时间段都出现的产品
-                sorted_products = sorted(
-                    [(name, len(product_period_count.get((platform, segment, name), set()))) 
-                     for name in product_names],
-                    key=lambda x: x[1], 
-                    reverse=True
-                )
-                
-                for product_name, count in sorted_products:
-                    if count > 1:  # 只对比在多个时间段出现的产品
-                        product_data = segment_data[segment_data['商品名称'] == product_name]
-                        
-                        row = {
-                            '平台': platform, 
-                            '价位段': segment, 
-                            '商品名称': product_name, 
-                            '商品链接': product_data['商品链接'].iloc[0]
-                        }
-                        
-                        # 添加每个时间段的零售额、零售量和成交均价
-                        for period in periods:
-                            period_value = product_data[product_data['时间段'] == period]
-                            if not period_value.empty:
-                                row[f'{period} 零售额'] = period_value['零售额'].values[0]
-                                row[f'{period} 零售量'] = period_value['零售量'].values[0]
-                                row[f'{period} 成交均价'] = period_value['成交均价'].values[0]
-                            else:
-                                row[f'{period} 零售额'] = None
-                                row[f'{period} 零售量'] = None
-                                row[f'{period} 成交均价'] = None
-                        
-                        # 计算环比变化
-                        sorted_periods = sorted(periods)
-                        
-                        # 零售额变化
-                        prev_value = None
-                        prev_period = None
-                        
-                        for period in sorted_periods:
-                            value_key = f'{period} 零售额'
-                            if value_key in row and row[value_key] is not None:
-                                if prev_value is not None and prev_period is not None and prev_value != 0:
-                                    row[f'{period} vs {prev_period} 零售额变化(%)'] = ((row[value_key] / prev_value) - 1) * 100
-                                prev_value = row[value_key]
-                                prev_period = period
-                        
-                        # 零售量变化
-                        prev_value = None
-                        prev_period = None
-                        
-                        for period in sorted_periods:
-                            value_key = f'{period} 零售量'
-                            if value_key in row and row[value_key] is not None:
-                                if prev_value is not None and prev_period is not None and prev_value != 0:
-                                    row[f'{period} vs {prev_period} 零售量变化(%)'] = ((row[value_key] / prev_value) - 1) * 100
-                                prev_value = row[value_key]
-                                prev_period = period
-                        
-                        # 成交均价变化
-                        prev_value = None
-                        prev_period = None
-                        
-                        for period in sorted_periods:
-                            value_key = f'{period} 成交均价'
-                            if value_key in row and row[value_key] is not None:
-                                if prev_value is not None and prev_period is not None and prev_value != 0:
-                                    row[f'{period} vs {prev_period} 均价变化(%)'] = ((row[value_key] / prev_value) - 1) * 100
-                                prev_value = row[value_key]
-                                prev_period = period
-                        
-                        comparison_data.append(row)
-    
-    # 创建DataFrame并写入Excel
-    if comparison_data:
-        comparison_df = pd.DataFrame(comparison_data)
-        
-        # 按平台、价位段排序，并按零售额降序排序
-        last_period = sorted(top_products['时间段'].unique())[-1] if len(top_products['时间段'].unique()) > 0 else None
-        if last_period and f'{last_period} 零售额' in comparison_df.columns:
-            comparison_df = comparison_df.sort_values(
-                by=['平台', '价位段', f'{last_period} 零售额'], 
-                ascending=[True, True, False]
-            )
-        
-        comparison_df.to_excel(writer, sheet_name='价位段产品对比分析', index=False)
-
-def main():
-    st.title("落地灯台灯数据分析工具")
-    
-    # 平台和时间段信息
-    st.subheader("数据上传配置")
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        num_platforms = st.number_input("上传平台数量", min_value=1, max_value=10, value=1)
-    
-    with col2:
-        num_periods = st.number_input("上传时间段数量", min_value=1, max_value=10, value=1)
-    
-    uploaded_files = []
-    platform_names = []
-    period_names = []
-    
-    # 时间段命名
-    st.write("时间段命名")
-    period_labels = []
-    for i in range(num_periods):
-        period_label = st.text_input(f"时间段 {i+1} 名称", f"时间段 {i+1}")
-        period_labels.append(period_label)
-    
-    # 平台配置和数据上传
-    for i in range(num_platforms):
-        st.write(f"平台 {i+1} 配置")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            platform_name = st.text_input(f"平台 {i+1} 名称", f"平台 {i+1}")
-        
-        # 为每个平台上传多个时间段的数据
-        for j in range(num_periods):
-            uploaded_file = st.file_uploader(
-                f"上传 {platform_name} - {period_labels[j]} Excel数据文件", 
-                type=['xlsx', 'xls'], 
-                key=f"platform_{i}_period_{j}"
-            )
-            uploaded_files.append(uploaded_file)
-            platform_names.append(platform_name)
-            period_names.append(period_labels[j])
-    
-    # 过滤掉未上传的文件
-    valid_files = [(f, p, t) for f, p, t in zip(uploaded_files, platform_names, period_names) if f is not None]
-    uploaded_valid_files = [f[0] for f in valid_files]
-    platform_valid_names = [f[1] for f in valid_files]
-    period_valid_names = [f[2] for f in valid_files]
-    
-    if len(valid_files) > 0:
-        # 合并所有平台和时间段数据
-        df = combine_platform_data(uploaded_valid_files, platform_valid_names, period_valid_names)
-        
-        if df is not None:
-            # 显示已上传的数据时间段
-            st.write("已上传的时间段：", ", ".join(sorted(df['时间段'].unique())))
-            
-            # 添加自定义价位段配置
-            st.subheader("价位段配置")
-            min_price = float(df['成交均价'].min())
-            max_price = float(df['成交均价'].max())
-            
-            with st.expander("自定义价位段"):
-                use_custom_segments = st.checkbox("使用自定义价位段", value=False)
-                
-                if use_custom_segments:
-                    # 用户自定义价位段界限
-                    st.write("输入自定义价位段界限（小值到大值，用逗号分隔）：")
-                    custom_ranges_str = st.text_input("例如：0,100,300,500,1000", f"{min_price},{(min_price+max_price)/2},{max_price}")
-                    
-                    try:
-                        price_ranges = [float(x) for x in custom_ranges_str.split(',')]
-                        price_ranges.sort()  # 确保是升序
-                        
-                        # 检查是否至少有两个界限
-                        if len(price_ranges) < 2:
-                            st.error("至少需要输入两个价位值才能形成一个价位段。")
-                            price_ranges = [min_price, max_price]
-                    except:
-                        st.error("输入格式有误，请使用逗号分隔的数字。")
-                        price_ranges = [min_price, max_price]
-                        
-                else:
-                    # 自动生成价位段
-                    num_segments = st.number_input("设置价位段数量", min_value=2, max_value=10, value=5)
-                    price_ranges = [min_price]
-                    
-                    for i in range(num_segments - 1):
-                        price = st.number_input(f"价位段 {i+1} 上限", 
-                                              min_value=float(min_price), 
-                                              max_value=float(max_price),
-                                              value=float(min_price + (max_price - min_price) * (i + 1) / num_segments))
-                        price_ranges.append(price)
-                    price_ranges.append(max_price)
-                
-                # 显示最终价位段
-                segments_display = [f"{price_ranges[i]}-{price_ranges[i+1]}" for i in range(len(price_ranges)-1)]
-                st.write("最终价位段设置：", ", ".join(segments_display))
-            
-            # 分析按钮
-            if st.button("开始分析"):
-                st.session_state.analysis_done = True
-                
-                # 1. 时间段统计
-                st.subheader("1. 时间段统计")
-                period_stats = calculate_period_stats(df, '时间段')
-                
-                # 添加时间段对比图表
-                st.write("时间段对比图表")
-                metrics = ['零售额', '零售量', '成交均价']
-                for metric in metrics:
-                    fig = plot_period_comparison(period_stats, '时间段', metric)
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                st.dataframe(period_stats)
-                
-                # 2. 品牌占比分析
-                st.subheader("2. TOP10品牌占比分析")
-                brand_stats = calculate_brand_share(df, '时间段')
-                
-                # 添加品牌对比图表
-                st.write("品牌对比图表")
-                fig = plot_brand_comparison(brand_stats, '时间段')
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # 获取每个时间段和平台的TOP10品牌
-                top_10_brands_list = []
-                
-                for p in brand_stats['时间段'].unique():
-                    for platform in brand_stats['平台'].unique():
-                        platform_period_data = brand_stats[
-                            (brand_stats['时间段'] == p) & 
-                            (brand_stats['平台'] == platform)
-                        ].sort_values(by='零售额', ascending=False).head(10)
-                        
-                        top_10_brands_list.append(platform_period_data)
-                
-                top_10_brands = pd.concat(top_10_brands_list, ignore_index=True)
-                st.dataframe(top_10_brands)
-                
-                # 3. 价位段分析
-                st.subheader("3. 价位段分析")
-                
-                # 3a. 价位段统计
-                st.write("3a. 价位段统计")
-                segment_stats = analyze_price_segments(df, '时间段', price_ranges)
-                
-                # 添加价位段对比图表
-                st.write("价位段对比图表")
-                fig = plot_price_segment_comparison(segment_stats, '时间段')
-                st.plotly_chart(fig, use_container_width=True)
-                
-                st.dataframe(segment_stats)
-                
-                # 3b. 价位段TOP品牌
-                st.write("3b. 价位段TOP5品牌")
-                top_brands = get_top_brands_by_segment(df, '时间段', price_ranges)
-                st.dataframe(top_brands)
-                
-                # 3c. 价位段TOP产品
-                st.write("3c. 价位段TOP5产品")
-                top_products = get_top_products_by_segment(df, '时间段', price_ranges)
-                st.dataframe(top_products)
-                
-                # 导出分析结果
-                st.subheader("导出分析结果")
-                
-                with pd.ExcelWriter('分析结果.xlsx', engine='openpyxl') as writer:
-                    # 使用美化功能
-                    format_excel_output(writer, period_stats, top_10_brands, segment_stats, top_brands, top_products)
-                
-                with open('分析结果.xlsx', 'rb') as f:
-                    st.download_button(
-                        label="下载分析结果",
-                        data=f,
-                        file_name="分析结果.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
-
-if __name__ == "__main__":
+import streamlit as st
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+import io
+import numpy as np
+
+st.set_page_config(page_title="落地灯台灯数据分析工具", layout="wide")
+
+# st.cache_data默认对超大DataFrame抽样哈希（可能误判缓存命中），且会额外哈希索引和dtype；
+# 统一改用pandas向量化的全量行哈希作为缓存键
+_DF_HASH_FUNCS = {pd.DataFrame: lambda df: pd.util.hash_pandas_object(df, index=False).values.tobytes()}
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl="1h")
+def load_data(file_bytes, file_name):
+    """加载Excel数据（按文件内容缓存，避免Streamlit每次rerun重复解析）
+
+    可能在工作线程中运行，错误信息以返回值形式交给调用方在主线程展示。
+    返回(df, 错误信息)，成功时错误信息为None。
+    """
+    try:
+        # calamine引擎（Rust实现）解析xlsx比默认的openpyxl快一个数量级，内存占用也更低；
+        # pyarrow后端让字符串列以Arrow字典数组落地，不经过Python对象列，
+        # 合并阶段的category转换和数值向下转型会把各列归一到numpy dtype
+        df = pd.read_excel(io.BytesIO(file_bytes), engine='calamine', dtype_backend='pyarrow')
+        required_columns = ['商品名称', '商品链接', '零售额', '零售量', '成交均价', '品牌']
+        if not all(col in df.columns for col in required_columns):
+            return None, f"{file_name} 文件格式不正确，请确保包含所有必需列：商品名称、商品链接、零售额、零售量、成交均价、品牌"
+        return df, None
+    except Exception as e:
+        return None, f"加载文件 {file_name} 时出错：{str(e)}"
+
+@st.cache_data(show_spinner=False)
+def combine_platform_data(uploaded_files, platform_names, period_names):
+    """合并多个平台和多个时间段的数据"""
+    # 多个文件的解析放进线程池并行（解析期间释放GIL，总耗时≈最慢的单个文件）；
+    # 已缓存的文件在对应线程里直接命中，开销可忽略
+    with ThreadPoolExecutor(max_workers=min(8, len(uploaded_files))) as executor:
+        results = list(executor.map(lambda f: load_data(f.getvalue(), f.name), uploaded_files))
+
+    all_data = []
+    for (df, error), platform, period in zip(results, platform_names, period_names):
+        if error is not None:
+            st.error(error)
+        elif df is not None:
+            df['平台'] = platform
+            df['时间段'] = period
+            all_data.append(df)
+
+
+    if len(all_data) > 0:
+        combined_df = pd.concat(all_data, ignore_index=True)
+        # 压缩dtype：字符串列转category、数值列向下转型，
+        # 后续分组按category编码哈希，内存和耗时都明显下降
+        for col in ('平台', '品牌', '商品名称', '商品链接'):
+            combined_df[col] = combined_df[col].astype('category')
+        # 时间段额外设为有序category（类别按字典序），排序和比较走整型码
+        combined_df['时间段'] = pd.Categorical(combined_df['时间段'], ordered=True)
+        combined_df['零售量'] = pd.to_numeric(combined_df['零售量'], downcast='integer')
+        # 成交均价不向下转型：价位段界限取自它的最小/最大值，float32回读会带上
+        # 长尾小数（如899.96变成899.9600219726562），污染价位段标签和输入框默认值
+        combined_df['零售额'] = pd.to_numeric(combined_df['零售额'], downcast='float')
+        # 按常用分组键预排序（价位段在分析阶段才生成），后续groupby配合sort=False
+        # 直接沿用这里的顺序，输出顺序也更自然
+        combined_df = combined_df.sort_values(['时间段', '平台', '品牌'], kind='mergesort', ignore_index=True)
+        return combined_df
+    else:
+        st.error("所有上传的文件均无法解析，请检查文件格式")
+        return None
+
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS)
+def add_price_segments(df, price_ranges):
+    """按价位段界限给数据打上价位段标签（全局只分箱一次，供所有价位段分析复用）"""
+    df = df.copy()
+    labels = [f"{price_ranges[i]}-{price_ranges[i+1]}" for i in range(len(price_ranges)-1)]
+    df['价位段'] = pd.cut(df['成交均价'], bins=price_ranges, labels=labels)
+    return df
+
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS)
+def build_base_aggregate(df, period, platform_col='平台'):
+    """按最细粒度（时间段×平台×价位段×品牌）聚合一次原始数据
+
+    各分析函数在这个小得多的结果上再聚合，避免对原始数据做多次全表扫描。
+    价格合计/件数用于在更高层级还原成交均价的均值。
+    """
+    # dropna=False保留价位段为空（价格落在分箱范围外）的行，保证时间段/品牌口径的总量不变
+    base = df.groupby([period, platform_col, '价位段', '品牌'], observed=True, dropna=False, sort=False).agg(
+        零售额=('零售额', 'sum'),
+        零售量=('零售量', 'sum'),
+        价格合计=('成交均价', 'sum'),
+        件数=('成交均价', 'count')
+    ).reset_index()
+    return base
+
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS)
+def calculate_period_stats(base, period, platform_col='平台'):
+    """计算时间段统计信息（基于build_base_aggregate的细粒度聚合结果）"""
+    # 按时间段和平台再聚合
+    stats = base.groupby([period, platform_col], observed=True, sort=False).agg(
+        零售额=('零售额', 'sum'),
+        零售量=('零售量', 'sum'),
+        价格合计=('价格合计', 'sum'),
+        件数=('件数', 'sum')
+    ).reset_index()
+
+    # 平台累计直接由各平台聚合结果相加得到，不再回到细粒度数据
+    total_stats = stats.groupby([period], observed=True, sort=False).agg(
+        零售额=('零售额', 'sum'),
+        零售量=('零售量', 'sum'),
+        价格合计=('价格合计', 'sum'),
+        件数=('件数', 'sum')
+    ).reset_index()
+    total_stats[platform_col] = '所有平台'
+
+    # 合并平台数据和累计数据，并还原成交均价
+    # 两个frame列与dtype一致，copy=False让concat直接复用数据块，减少一次全量拷贝
+    all_stats = pd.concat([stats, total_stats], ignore_index=True, copy=False)
+    all_stats['成交均价'] = all_stats['价格合计'] / all_stats['件数']
+    # 不在这里round：小数位展示交给Excel层的数字格式，省掉一次全表拷贝
+    all_stats = all_stats.drop(columns=['价格合计', '件数'])
+
+    # 计算同比变化（排序一次后按平台分组pct_change，替代逐平台过滤+拷贝）
+    all_stats = all_stats.sort_values([platform_col, period], ignore_index=True)
+    for metric, out in [('零售额', '零售额同比变化'), ('零售量', '零售量同比变化'), ('成交均价', '成交均价同比变化')]:
+        all_stats[out] = all_stats.groupby(platform_col, observed=True, sort=False)[metric].pct_change() * 100
+
+    return all_stats
+
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS)
+def calculate_brand_share(base, period, platform_col='平台'):
+    """计算品牌占比（基于build_base_aggregate的细粒度聚合结果）"""
+    # 按时间段、平台和品牌再聚合
+    brand_stats = base.groupby([period, platform_col, '品牌'], observed=True, sort=False).agg(
+        零售额=('零售额', 'sum'),
+        零售量=('零售量', 'sum')
+    ).reset_index()
+
+    # 计算占比。分母取base的全量汇总：brand_stats的分组键含品牌，
+    # 品牌为空的行会被丢掉，直接transform会让分母少掉这部分
+    platform_totals = base.groupby([period, platform_col], observed=True).agg(
+        零售额合计=('零售额', 'sum'),
+        零售量合计=('零售量', 'sum')
+    ).reset_index()
+    brand_stats = brand_stats.merge(platform_totals, on=[period, platform_col], how='left')
+    brand_stats['零售额占比'] = brand_stats['零售额'] / brand_stats['零售额合计'] * 100
+    brand_stats['零售量占比'] = brand_stats['零售量'] / brand_stats['零售量合计'] * 100
+    brand_stats = brand_stats.drop(columns=['零售额合计', '零售量合计'])
+
+    # 添加所有平台合计数据（由各平台聚合结果相加得到），分母同样取base的全量汇总
+    all_platform_brand_stats = brand_stats.groupby([period, '品牌'], observed=True, sort=False).agg(
+        零售额=('零售额', 'sum'),
+        零售量=('零售量', 'sum')
+    ).reset_index()
+
+    all_platform_brand_stats[platform_col] = '所有平台'
+    period_totals = base.groupby([period], observed=True).agg(
+        零售额合计=('零售额', 'sum'),
+        零售量合计=('零售量', 'sum')
+    ).reset_index()
+    all_platform_brand_stats = all_platform_brand_stats.merge(period_totals, on=[period], how='left')
+    all_platform_brand_stats['零售额占比'] = all_platform_brand_stats['零售额'] / all_platform_brand_stats['零售额合计'] * 100
+    all_platform_brand_stats['零售量占比'] = all_platform_brand_stats['零售量'] / all_platform_brand_stats['零售量合计'] * 100
+    all_platform_brand_stats = all_platform_brand_stats.drop(columns=['零售额合计', '零售量合计'])
+    
+    # 合并所有数据
+    all_brand_stats = pd.concat([brand_stats, all_platform_brand_stats], ignore_index=True, copy=False)
+    
+    return all_brand_stats
+
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS)
+def analyze_price_segments(base, period, platform_col='平台'):
+    """分析价位段（基于build_base_aggregate的细粒度聚合结果）"""
+    # 按时间段、平台和价位段再聚合
+    segment_stats = base.groupby([period, platform_col, '价位段'], observed=True, sort=False).agg(
+        零售额=('零售额', 'sum'),
+        零售量=('零售量', 'sum')
+    ).reset_index()
+    
+    # 计算占比。分母取base的全量汇总：segment_stats的分组键含价位段，
+    # 价格落在分箱范围外（价位段为空）的行已被丢掉，直接transform会把
+    # 分母缩成"已分箱部分"的合计，占比口径与原始数据的平台总量不符
+    platform_totals = base.groupby([period, platform_col], observed=True).agg(
+        零售额合计=('零售额', 'sum'),
+        零售量合计=('零售量', 'sum')
+    ).reset_index()
+    segment_stats = segment_stats.merge(platform_totals, on=[period, platform_col], how='left')
+    segment_stats['零售额占比'] = segment_stats['零售额'] / segment_stats['零售额合计'] * 100
+    segment_stats['零售量占比'] = segment_stats['零售量'] / segment_stats['零售量合计'] * 100
+    segment_stats = segment_stats.drop(columns=['零售额合计', '零售量合计'])
+
+    # 添加所有平台合计数据（由各平台聚合结果相加得到），分母同样取base的全量汇总
+    all_platform_segment_stats = segment_stats.groupby([period, '价位段'], observed=True, sort=False).agg(
+        零售额=('零售额', 'sum'),
+        零售量=('零售量', 'sum')
+    ).reset_index()
+
+    all_platform_segment_stats[platform_col] = '所有平台'
+    period_totals = base.groupby([period], observed=True).agg(
+        零售额合计=('零售额', 'sum'),
+        零售量合计=('零售量', 'sum')
+    ).reset_index()
+    all_platform_segment_stats = all_platform_segment_stats.merge(period_totals, on=[period], how='left')
+    all_platform_segment_stats['零售额占比'] = all_platform_segment_stats['零售额'] / all_platform_segment_stats['零售额合计'] * 100
+    all_platform_segment_stats['零售量占比'] = all_platform_segment_stats['零售量'] / all_platform_segment_stats['零售量合计'] * 100
+    all_platform_segment_stats = all_platform_segment_stats.drop(columns=['零售额合计', '零售量合计'])
+    
+    # 合并所有数据
+    all_segment_stats = pd.concat([segment_stats, all_platform_segment_stats], ignore_index=True, copy=False)
+    
+    # 计算同比变化（排序一次后按平台×价位段分组pct_change，替代双重循环过滤+拷贝）
+    all_segment_stats = all_segment_stats.sort_values([platform_col, '价位段', period], ignore_index=True)
+    for metric, out in [('零售额占比', '零售额占比变化'), ('零售量占比', '零售量占比变化')]:
+        all_segment_stats[out] = all_segment_stats.groupby([platform_col, '价位段'], observed=True, sort=False)[metric].pct_change() * 100
+
+    return all_segment_stats
+
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS)
+def get_top_brands_by_segment(base, period, platform_col='平台', n=5):
+    """获取每个价位段的TOP品牌（基于build_base_aggregate的细粒度聚合结果）"""
+    # 细粒度聚合结果本身就是时间段×平台×价位段×品牌粒度
+    top_brands = base.drop(columns=['价格合计', '件数'])
+
+    # 计算品牌占比（向量化除以每个时间段、平台和价位段的总量，避免逐行apply）
+    top_brands['零售额占比'] = top_brands['零售额'] / top_brands.groupby([period, platform_col, '价位段'], observed=True)['零售额'].transform('sum') * 100
+    top_brands['零售量占比'] = top_brands['零售量'] / top_brands.groupby([period, platform_col, '价位段'], observed=True)['零售量'].transform('sum') * 100
+    
+    # 获取各平台TOP N品牌（整体排序一次后按组取前N，替代逐组循环）
+    top_brands_results = (top_brands
+                          .sort_values(by='零售额', ascending=False)
+                          .groupby([period, platform_col, '价位段'], observed=True, sort=False)
+                          .head(n))
+
+    # 添加所有平台合计数据（由各平台聚合结果相加得到）
+    all_platform_top_brands = top_brands.groupby([period, '价位段', '品牌'], observed=True, sort=False).agg(
+        零售额=('零售额', 'sum'),
+        零售量=('零售量', 'sum')
+    ).reset_index()
+    
+    # 计算汇总的品牌占比
+    all_platform_top_brands['零售额占比'] = all_platform_top_brands['零售额'] / all_platform_top_brands.groupby([period, '价位段'], observed=True)['零售额'].transform('sum') * 100
+    all_platform_top_brands['零售量占比'] = all_platform_top_brands['零售量'] / all_platform_top_brands.groupby([period, '价位段'], observed=True)['零售量'].transform('sum') * 100
+    all_platform_top_brands[platform_col] = '所有平台'
+    
+    # 获取所有平台TOP N品牌
+    all_platform_results = (all_platform_top_brands
+                            .sort_values(by='零售额', ascending=False)
+                            .groupby([period, '价位段'], observed=True, sort=False)
+                            .head(n))
+
+    # 合并所有结果，并按分组键重排：全局排序取TOP N后行序是全局零售额降序，
+    # 重排成(时间段, 平台, 价位段)连续区块、组内零售额降序，报表才可读
+    results = pd.concat([top_brands_results, all_platform_results], ignore_index=True, copy=False)
+    return results.sort_values([period, platform_col, '价位段', '零售额'],
+                               ascending=[True, True, True, False], ignore_index=True)
+
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS)
+def get_top_products_by_segment(df, period, platform_col='平台', n=5):
+    """获取每个价位段的TOP产品（要求df已包含价位段列，见add_price_segments）"""
+    # 按时间段、平台、价位段和产品名称分组计算统计数据
+    top_products = df.groupby([period, platform_col, '价位段', '商品名称', '商品链接'], observed=True, sort=False).agg(
+        零售额=('零售额', 'sum'),
+        零售量=('零售量', 'sum'),
+        成交均价=('成交均价', 'mean')
+    ).reset_index()
+    
+    # 获取各平台TOP N产品（整体排序一次后按组取前N，替代逐组循环）
+    top_products_results = (top_products
+                            .sort_values(by='零售额', ascending=False)
+                            .groupby([period, platform_col, '价位段'], observed=True, sort=False)
+                            .head(n))
+
+    # 添加所有平台合计数据
+    # 按时间段、价位段和产品名称分组计算汇总数据
+    all_platform_top_products = df.groupby([period, '价位段', '商品名称', '商品链接'], observed=True, sort=False).agg(
+        零售额=('零售额', 'sum'),
+        零售量=('零售量', 'sum'),
+        成交均价=('成交均价', 'mean')
+    ).reset_index()
+    
+    all_platform_top_products[platform_col] = '所有平台'
+    
+    # 获取所有平台TOP N产品
+    all_platform_results = (all_platform_top_products
+                            .sort_values(by='零售额', ascending=False)
+                            .groupby([period, '价位段'], observed=True, sort=False)
+                            .head(n))
+
+    # 合并所有结果，并按分组键重排成连续区块、组内零售额降序（同TOP品牌）
+    results = pd.concat([top_products_results, all_platform_results], ignore_index=True, copy=False)
+    return results.sort_values([period, platform_col, '价位段', '零售额'],
+                               ascending=[True, True, True, False], ignore_index=True)
+
+def plot_period_comparison(df, period, metric, platform_col='平台'):
+    """绘制时间段对比图表"""
+    # plotly体量大，延迟到绘图时再导入，缩短应用冷启动（模块缓存保证只导入一次）
+    import plotly.express as px
+    fig = px.line(df, x=period, y=metric, color=platform_col,
+                  title=f'{metric}时间段对比',
+                  labels={period: '时间段', metric: metric})
+    return fig
+
+def plot_brand_comparison(df, period, platform_col='平台', n=10):
+    """绘制品牌对比图表"""
+    import plotly.express as px
+    # 获取每个时间段TOP N品牌
+    top_brands = df.groupby([period, platform_col, '品牌'], observed=True)['零售额'].sum().reset_index()
+    top_brands = top_brands.sort_values([period, platform_col, '零售额'], ascending=[True, True, False])
+    top_brands = top_brands.groupby([period, platform_col], observed=True).head(n)
+    
+    fig = px.bar(top_brands, x='品牌', y='零售额', color=platform_col,
+                 title=f'TOP {n}品牌对比',
+                 labels={'品牌': '品牌名称', '零售额': '零售额'})
+    return fig
+
+def plot_price_segment_comparison(df, period, platform_col='平台'):
+    """绘制价位段对比图表"""
+    import plotly.express as px
+    fig = px.bar(df, x='价位段', y='零售额占比', color=platform_col,
+                 title='各价位段零售额占比对比',
+                 labels={'价位段': '价位段', '零售额占比': '零售额占比(%)'})
+    return fig
+
+def format_excel_output(writer, period_stats, top_10_brands, segment_stats, top_brands, top_products):
+    """美化Excel输出格式，让不同时间段对比更直观"""
+    workbook = writer.book
+
+    # 基础样式（xlsxwriter的格式对象在整个工作簿共享，只创建一次）
+    header_fmt = workbook.add_format({
+        'bold': True, 'font_color': 'FFFFFF', 'bg_color': '4F81BD',
+        'border': 1, 'align': 'center', 'valign': 'vcenter', 'text_wrap': True,
+    })
+    alt_row_fmt = workbook.add_format({'bg_color': 'F5F5F5'})
+    # 浮点列统一套两位小数的列格式，分析函数里不再round
+    float_col_fmt = workbook.add_format({'num_format': '#,##0.00'})
+    color_scale = {
+        'type': '3_color_scale',
+        'min_color': '#E67C73',  # 红色（负值）
+        'mid_type': 'num', 'mid_value': 0, 'mid_color': '#FFFFFF',  # 白色（零值）
+        'max_color': '#57BB8A',  # 绿色（正值）
+    }
+
+    # 安全处理分类数据和NaN值：分类列转普通字符串列，再填充NaN，一次处理完所有表
+    def _prepare(df):
+        category_cols = {col: df[col].astype(str) for col, dtype in df.dtypes.items()
+                         if str(dtype) == 'category'}
+        if category_cols:
+            df = df.assign(**category_cols)
+        return df.fillna(0)
+
+    period_stats = _prepare(period_stats)
+    top_10_brands = _prepare(top_10_brands)
+    segment_stats = _prepare(segment_stats)
+    top_brands = _prepare(top_brands)
+    top_products = _prepare(top_products)
+
+    # 表为空时写入一个提示表，防止"At least one sheet must be visible"错误
+    if top_brands.empty:
+        top_brands = pd.DataFrame({'提示': ['没有找到符合条件的价位段TOP品牌数据']})
+    if top_products.empty:
+        top_products = pd.DataFrame({'提示': ['没有找到符合条件的价位段TOP产品数据']})
+
+    # 记录每个工作表写入的数据，供后面按列计算宽度等样式使用
+    sheet_frames = {
+        '时间段统计': period_stats,
+        '品牌占比分析': top_10_brands,
+        '价位段统计': segment_stats,
+        '价位段TOP品牌': top_brands,
+        '价位段TOP产品': top_products,
+    }
+
+    for sheet_name, sheet_df in sheet_frames.items():
+        sheet_df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+    # 时间段列表在最小的period_stats上提取一次传给各对比表函数，
+    # 避免每个函数各自对大表做整列unique()扫描后才发现无需创建
+    periods = sorted(period_stats['时间段'].unique()) if '时间段' in period_stats.columns else []
+
+    # 创建各种对比专用表（写入了的返回对应数据）
+    comparison_frames = [
+        ('时间段对比分析', create_period_comparison_sheet(writer, period_stats, periods)),
+        ('品牌占比对比分析', create_brand_comparison_sheet(writer, top_10_brands, periods)),
+        ('价位段占比对比分析', create_segment_comparison_sheet(writer, segment_stats, periods)),
+    ]
+
+    # 只有当数据不为空时才创建这些表
+    if '时间段' in top_brands.columns and len(periods) > 1:
+        comparison_frames.append(('价位段品牌对比分析', create_top_brands_comparison_sheet(writer, top_brands, periods)))
+
+    if '时间段' in top_products.columns and len(periods) > 1:
+        comparison_frames.append(('价位段产品对比分析', create_top_products_comparison_sheet(writer, top_products, periods)))
+
+    for sheet_name, sheet_df in comparison_frames:
+        if sheet_df is not None:
+            sheet_frames[sheet_name] = sheet_df
+
+    # 应用样式到所有工作表
+    for sheet_name, sheet_df in sheet_frames.items():
+        ws = writer.sheets[sheet_name]
+        n_rows = len(sheet_df)
+
+        for i, col in enumerate(sheet_df.columns):
+            # 设置表头样式（xlsxwriter只能在写入时套用格式，重写表头单元格）
+            ws.write(0, i, str(col), header_fmt)
+
+            # 调整列宽（从写入的DataFrame按列向量化计算内容长度，避免逐单元格访问）
+            content_length = sheet_df[col].astype(str).str.len().max()
+            max_length = max(len(str(col)), 0 if pd.isna(content_length) else int(content_length))
+            width = min(max(15, max_length + 2), 40)  # 最小15，最大40
+            # 浮点列附带两位小数的数字格式（单元格级的显式格式优先级更高，不受影响）
+            col_fmt = float_col_fmt if pd.api.types.is_float_dtype(sheet_df[col]) else None
+            ws.set_column(i, i, width, col_fmt)
+
+        # 应用条件格式到变化率列
+        if sheet_name == '时间段统计':
+            for col in ['零售额同比变化', '零售量同比变化', '成交均价同比变化']:
+                if col in sheet_df.columns:
+                    col_idx = sheet_df.columns.get_loc(col)
+                    ws.conditional_format(1, col_idx, n_rows, col_idx, color_scale)
+
+        # 对所有对比分析表应用条件格式
+        if '对比分析' in sheet_name:
+            # 只对变化率列应用条件格式
+            for i, col in enumerate(sheet_df.columns):
+                if '(%)' in str(col) or '变化' in str(col):
+                    ws.conditional_format(1, i, n_rows, i, color_scale)
+
+            # 添加交替行颜色，增强可读性（整行设置一次格式，而不是逐单元格填充）
+            for row in range(1, n_rows + 1, 2):
+                ws.set_row(row, None, alt_row_fmt)
+
+def create_period_comparison_sheet(writer, period_stats, periods):
+    """创建时间段对比专用表（periods为调用方提取好的有序时间段列表）"""
+    # 只有当有多个时间段时才创建对比表
+    if len(periods) <= 1:
+        return
+
+    # 长表转宽表：一次pivot得到各平台各指标在每个时间段的取值，替代逐平台逐指标循环取数
+    metrics = ['零售额', '零售量', '成交均价']
+    wide = period_stats.melt(id_vars=['平台', '时间段'], value_vars=metrics, var_name='指标名')
+    wide = wide.pivot_table(index=['平台', '指标名'], columns='时间段', values='value',
+                            aggfunc='first', observed=True)
+
+    # 只保留出现在多个时间段的平台（与原有对比口径一致）
+    wide = wide[wide.notna().sum(axis=1) > 1]
+
+    # 计算环比变化率（整列相除，前值为0或缺失时记为空）
+    for i in range(1, len(periods)):
+        prev_period = periods[i-1]
+        curr_period = periods[i]
+        wide[f'{curr_period} vs {prev_period} (%)'] = (wide[curr_period] / wide[prev_period].replace(0, np.nan) - 1) * 100
+
+    # 创建DataFrame并写入Excel
+    if not wide.empty:
+        comparison_df = wide.reset_index()
+        comparison_df['指标名'] = pd.Categorical(comparison_df['指标名'], categories=metrics, ordered=True)
+        comparison_df = comparison_df.sort_values(['平台', '指标名'])
+        comparison_df.insert(0, '指标', comparison_df['平台'].astype(str) + ' - ' + comparison_df['指标名'].astype(str))
+        comparison_df = comparison_df.drop(columns=['平台', '指标名'])
+
+        comparison_df.to_excel(writer, sheet_name='时间段对比分析', index=False)
+
+        # 格式化百分比列和数值列（xlsxwriter在写入时套用格式，重写对应单元格；格式对象共享）
+        ws = writer.sheets['时间段对比分析']
+        pct_fmt = writer.book.add_format({'num_format': '0.00%'})
+        price_fmt = writer.book.add_format({'num_format': '#,##0.00'})  # 均价保留两位小数
+        thousands_fmt = writer.book.add_format({'num_format': '#,##0'})  # 其他数值采用千分位格式
+        labels = comparison_df['指标'].tolist()
+        for i, col_name in enumerate(comparison_df.columns):
+            if '(%)' in col_name:
+                for row, value in enumerate(comparison_df[col_name], start=1):
+                    if pd.notna(value):
+                        ws.write_number(row, i, value, pct_fmt)
+            elif col_name in periods:  # 为数值列添加千分位格式
+                for row, value in enumerate(comparison_df[col_name], start=1):
+                    if pd.notna(value):
+                        ws.write_number(row, i, value, price_fmt if '均价' in labels[row - 1] else thousands_fmt)
+
+        return comparison_df
+
+def create_brand_comparison_sheet(writer, top_brands, periods):
+    """创建品牌占比对比专用表（periods为调用方提取好的有序时间段列表）"""
+    # 如果没有品牌数据或时间段不足，则不创建
+    if top_brands.empty or len(periods) <= 1:
+        return
+
+    # 长表转宽表：一次pivot得到各品牌在每个时间段的零售额和占比，替代逐品牌逐时间段取数
+    pvt = top_brands.pivot_table(index=['平台', '品牌'], columns='时间段',
+                                 values=['零售额', '零售额占比'], aggfunc='first', observed=True)
+
+    # 只分析在多个时间段出现的品牌
+    pvt = pvt[pvt['零售额占比'].notna().sum(axis=1) > 1]
+
+    # 创建DataFrame并写入Excel
+    if not pvt.empty:
+        comparison_df = pd.DataFrame(index=pvt.index)
+        for period in periods:
+            comparison_df[f'{period} 零售额'] = pvt[('零售额', period)]
+            comparison_df[f'{period} 零售额占比(%)'] = pvt[('零售额占比', period)]
+
+        # 计算环比变化（整列相减）
+        for i in range(1, len(periods)):
+            prev_period = periods[i-1]
+            curr_period = periods[i]
+            comparison_df[f'{curr_period} vs {prev_period} 占比变化(%)'] = \
+                pvt[('零售额占比', curr_period)] - pvt[('零售额占比', prev_period)]
+
+        comparison_df = comparison_df.reset_index()
+        comparison_df.to_excel(writer, sheet_name='品牌占比对比分析', index=False)
+        return comparison_df
+
+def create_segment_comparison_sheet(writer, segment_stats, periods):
+    """创建价位段对比专用表（periods为调用方提取好的有序时间段列表）"""
+    # 如果没有价位段数据或时间段不足，则不创建
+    if segment_stats.empty or len(periods) <= 1:
+        return
+
+    # 长表转宽表：一次pivot得到各价位段在每个时间段的零售额和占比
+    pvt = segment_stats.pivot_table(index=['平台', '价位段'], columns='时间段',
+                                    values=['零售额', '零售额占比'], aggfunc='first', observed=True)
+
+    # 只分析在多个时间段出现的价位段
+    pvt = pvt[pvt['零售额占比'].notna().sum(axis=1) > 1]
+
+    # 创建DataFrame并写入Excel
+    if not pvt.empty:
+        comparison_df = pd.DataFrame(index=pvt.index)
+        for period in periods:
+            comparison_df[f'{period} 零售额'] = pvt[('零售额', period)]
+            comparison_df[f'{period} 零售额占比(%)'] = pvt[('零售额占比', period)]
+
+        # 计算环比变化（整列相减）
+        for i in range(1, len(periods)):
+            prev_period = periods[i-1]
+            curr_period = periods[i]
+            comparison_df[f'{curr_period} vs {prev_period} 占比变化(%)'] = \
+                pvt[('零售额占比', curr_period)] - pvt[('零售额占比', prev_period)]
+
+        comparison_df = comparison_df.reset_index()
+        comparison_df.to_excel(writer, sheet_name='价位段占比对比分析', index=False)
+        return comparison_df
+
+def create_top_brands_comparison_sheet(writer, top_brands_segment, periods):
+    """创建价位段TOP品牌对比专用表（periods为调用方提取好的有序时间段列表）"""
+    # 如果没有价位段TOP品牌数据或时间段不足，则不创建
+    if top_brands_segment.empty or len(periods) <= 1:
+        return
+
+    # 长表转宽表：一次pivot得到各价位段TOP品牌在每个时间段的零售额和占比
+    pvt = top_brands_segment.pivot_table(index=['平台', '价位段', '品牌'], columns='时间段',
+                                         values=['零售额', '零售额占比'], aggfunc='first', observed=True)
+
+    # 只分析在多个时间段出现的品牌
+    pvt = pvt[pvt['零售额占比'].notna().sum(axis=1) > 1]
+
+    # 创建DataFrame并写入Excel
+    if not pvt.empty:
+        comparison_df = pd.DataFrame(index=pvt.index)
+        for period in periods:
+            comparison_df[f'{period} 零售额'] = pvt[('零售额', period)]
+            comparison_df[f'{period} 零售额占比(%)'] = pvt[('零售额占比', period)]
+
+        # 计算环比变化（整列相减）
+        for i in range(1, len(periods)):
+            prev_period = periods[i-1]
+            curr_period = periods[i]
+            comparison_df[f'{curr_period} vs {prev_period} 占比变化(%)'] = \
+                pvt[('零售额占比', curr_period)] - pvt[('零售额占比', prev_period)]
+
+        comparison_df = comparison_df.reset_index()
+
+        # 按价位段排序品牌对比数据（列存在与否用if判断即可，不再用裸except兜底）
+        last_period_column = f'{periods[-1]} 零售额占比(%)'
+        if last_period_column in comparison_df.columns:
+            comparison_df = comparison_df.sort_values(
+                by=['平台', '价位段', last_period_column],
+                ascending=[True, True, False]
+            )
+
+        comparison_df.to_excel(writer, sheet_name='价位段品牌对比分析', index=False)
+        return comparison_df
+
+def create_top_products_comparison_sheet(writer, top_products, all_periods):
+    """创建价位段TOP产品时间段对比专用表（all_periods为调用方提取好的有序时间段列表）"""
+    # 如果没有价位段产品数据或时间段不足，则不创建
+    if top_products.empty or len(all_periods) <= 1:
+        return
+
+    # 长表转宽表：一次pivot得到各产品在每个时间段的零售额/零售量/均价，
+    # 替代逐平台×价位段×产品的布尔掩码循环和iterrows计数
+    pvt = top_products.pivot_table(index=['平台', '价位段', '商品名称'], columns='时间段',
+                                   values=['零售额', '零售量', '成交均价'],
+                                   aggfunc='first', observed=True)
+
+    # 只对比在多个时间段出现的产品
+    pvt = pvt[pvt['零售额'].notna().sum(axis=1) > 1]
+    if pvt.empty:
+        return
+
+    # 商品链接每个产品取一条即可
+    links = top_products.groupby(['平台', '价位段', '商品名称'], observed=True, sort=False)['商品链接'].first()
+
+    comparison_df = pd.DataFrame(index=pvt.index)
+    comparison_df['商品链接'] = links
+    for period in all_periods:
+        for metric in ('零售额', '零售量', '成交均价'):
+            if (metric, period) in pvt.columns:
+                comparison_df[f'{period} {metric}'] = pvt[(metric, period)]
+
+    # 计算环比变化（整列相除，前值为0或缺失时记为空；与其他对比表一致，统一取相邻时间段）
+    for metric, label in (('零售额', '零售额变化(%)'), ('零售量', '零售量变化(%)'), ('成交均价', '均价变化(%)')):
+        for i in range(1, len(all_periods)):
+            prev_period, curr_period = all_periods[i-1], all_periods[i]
+            if (metric, prev_period) in pvt.columns and (metric, curr_period) in pvt.columns:
+                comparison_df[f'{curr_period} vs {prev_period} {label}'] = \
+                    (pvt[(metric, curr_period)] / pvt[(metric, prev_period)].replace(0, np.nan) - 1) * 100
+
+    comparison_df = comparison_df.reset_index()
+
+    # 按平台、价位段排序，并按最近时间段零售额降序排序
+    last_period = all_periods[-1]
+    if f'{last_period} 零售额' in comparison_df.columns:
+        comparison_df = comparison_df.sort_values(
+            by=['平台', '价位段', f'{last_period} 零售额'],
+            ascending=[True, True, False]
+        )
+
+    comparison_df.to_excel(writer, sheet_name='价位段产品对比分析', index=False)
+    return comparison_df
+
+def main():
+    st.title("落地灯台灯数据分析工具")
+    
+    # 平台和时间段信息
+    st.subheader("数据上传配置")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        num_platforms = st.number_input("上传平台数量", min_value=1, max_value=10, value=1)
+    
+    with col2:
+        num_periods = st.number_input("上传时间段数量", min_value=1, max_value=10, value=1)
+    
+    # 每个上传槽位直接记录(文件, 平台, 时间段)三元组，免去三个平行列表再zip重组
+    upload_slots = []
+    
+    # 时间段命名
+    st.write("时间段命名")
+    period_labels = []
+    for i in range(num_periods):
+        period_label = st.text_input(f"时间段 {i+1} 名称", f"时间段 {i+1}")
+        period_labels.append(period_label)
+    
+    # 平台配置和数据上传
+    for i in range(num_platforms):
+        st.write(f"平台 {i+1} 配置")
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            platform_name = st.text_input(f"平台 {i+1} 名称", f"平台 {i+1}")
+        
+        # 为每个平台上传多个时间段的数据
+        for j in range(num_periods):
+            uploaded_file = st.file_uploader(
+                f"上传 {platform_name} - {period_labels[j]} Excel数据文件", 
+                type=['xlsx', 'xls'], 
+                key=f"platform_{i}_period_{j}"
+            )
+            upload_slots.append((uploaded_file, platform_name, period_labels[j]))
+
+    # 过滤掉未上传的文件
+    valid_slots = [slot for slot in upload_slots if slot[0] is not None]
+
+    if len(valid_slots) > 0:
+        uploaded_valid_files, platform_valid_names, period_valid_names = map(list, zip(*valid_slots))
+        # 合并所有平台和时间段数据
+        df = combine_platform_data(uploaded_valid_files, platform_valid_names, period_valid_names)
+        
+        if df is not None:
+            # 显示已上传的数据时间段
+            # 时间段列是category，categories本身有序，O(1)读取，省掉整列unique+排序
+            st.write("已上传的时间段：", ", ".join(df['时间段'].cat.categories))
+            
+            # 添加自定义价位段配置
+            st.subheader("价位段配置")
+            min_price = float(df['成交均价'].min())
+            max_price = float(df['成交均价'].max())
+            
+            with st.expander("自定义价位段"):
+                use_custom_segments = st.checkbox("使用自定义价位段", value=False)
+                
+                if use_custom_segments:
+                    # 用户自定义价位段界限
+                    st.write("输入自定义价位段界限（小值到大值，用逗号分隔）：")
+                    custom_ranges_str = st.text_input("例如：0,100,300,500,1000", f"{min_price},{(min_price+max_price)/2},{max_price}")
+                    
+                    try:
+                        price_ranges = [float(x) for x in custom_ranges_str.split(',')]
+                        price_ranges.sort()  # 确保是升序
+                        
+                        # 检查是否至少有两个界限
+                        if len(price_ranges) < 2:
+                            st.error("至少需要输入两个价位值才能形成一个价位段。")
+                            price_ranges = [min_price, max_price]
+                    except:
+                        st.error("输入格式有误，请使用逗号分隔的数字。")
+                        price_ranges = [min_price, max_price]
+                        
+                else:
+                    # 自动生成价位段
+                    num_segments = st.number_input("设置价位段数量", min_value=2, max_value=10, value=5)
+                    price_ranges = [min_price]
+                    
+                    for i in range(num_segments - 1):
+                        price = st.number_input(f"价位段 {i+1} 上限", 
+                                              min_value=float(min_price), 
+                                              max_value=float(max_price),
+                                              value=float(min_price + (max_price - min_price) * (i + 1) / num_segments))
+                        price_ranges.append(price)
+                    price_ranges.append(max_price)
+                
+                # 显示最终价位段
+                segments_display = [f"{price_ranges[i]}-{price_ranges[i+1]}" for i in range(len(price_ranges)-1)]
+                st.write("最终价位段设置：", ", ".join(segments_display))
+            
+            # 分析按钮。analysis_done记录在session_state里，点过一次后
+            # 其他控件触发的rerun也会进入分析分支——各步骤都有st.cache_data，
+            # 重进时直接命中缓存，结果不会因为一次无关交互而消失
+            if st.button("开始分析"):
+                st.session_state.analysis_done = True
+
+            if st.session_state.get('analysis_done'):
+                # 按配置好的价位段界限统一分箱一次，供所有价位段分析复用
+                df = add_price_segments(df, price_ranges)
+
+                # 对原始数据只做一次细粒度聚合，后续统计都在聚合结果上再汇总
+                base = build_base_aggregate(df, '时间段')
+
+                # 1. 时间段统计
+                st.subheader("1. 时间段统计")
+                period_stats = calculate_period_stats(base, '时间段')
+                
+                # 添加时间段对比图表
+                st.write("时间段对比图表")
+                metrics = ['零售额', '零售量', '成交均价']
+                for metric in metrics:
+                    fig = plot_period_comparison(period_stats, '时间段', metric)
+                    st.plotly_chart(fig, use_container_width=True)
+                
+                st.dataframe(period_stats)
+                
+                # 2. 品牌占比分析
+                st.subheader("2. TOP10品牌占比分析")
+                brand_stats = calculate_brand_share(base, '时间段')
+                
+                # 添加品牌对比图表
+                st.write("品牌对比图表")
+                fig = plot_brand_comparison(brand_stats, '时间段')
+                st.plotly_chart(fig, use_container_width=True)
+                
+                # 获取每个时间段和平台的TOP10品牌（全局排序一次后分组取前10，
+                # 替代逐时间段×平台过滤+排序的双重循环）
+                top_10_brands = brand_stats.sort_values(
+                    ['时间段', '平台', '零售额'], ascending=[True, True, False]
+                ).groupby(['时间段', '平台'], observed=True, sort=False).head(10).reset_index(drop=True)
+                st.dataframe(top_10_brands)
+                
+                # 3. 价位段分析
+                st.subheader("3. 价位段分析")
+                
+                # 3a. 价位段统计
+                st.write("3a. 价位段统计")
+                segment_stats = analyze_price_segments(base, '时间段')
+                
+                # 添加价位段对比图表
+                st.write("价位段对比图表")
+                fig = plot_price_segment_comparison(segment_stats, '时间段')
+                st.plotly_chart(fig, use_container_width=True)
+                
+                st.dataframe(segment_stats)
+                
+                # 3b. 价位段TOP品牌
+                st.write("3b. 价位段TOP5品牌")
+                top_brands = get_top_brands_by_segment(base, '时间段')
+                st.dataframe(top_brands)
+                
+                # 3c. 价位段TOP产品
+                st.write("3c. 价位段TOP5产品")
+                top_products = get_top_products_by_segment(df, '时间段')
+                st.dataframe(top_products)
+                
+                # 导出分析结果
+                st.subheader("导出分析结果")
+                
+                # 直接写入内存缓冲，省掉写盘再读回的两次IO往返
+                # strings_to_urls=False跳过逐单元格的URL识别（商品链接列很大时开销可观）；
+                # constant_memory流式模式与写完数据后再套表头/条件格式的做法不兼容，故不启用
+                excel_buffer = io.BytesIO()
+                with pd.ExcelWriter(excel_buffer, engine='xlsxwriter',
+                                    engine_kwargs={'options': {'strings_to_urls': False}}) as writer:
+                    # 使用美化功能
+                    format_excel_output(writer, period_stats, top_10_brands, segment_stats, top_brands, top_products)
+
+                st.download_button(
+                    label="下载分析结果",
+                    data=excel_buffer.getvalue(),
+                    file_name="分析结果.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+
+if __name__ == "__main__":
     main() 
\ No newline at end of file